@@ -17,8 +17,10 @@
 # You should have received a copy of the GNU General Public License
 # along with Kitty.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import socket
 import subprocess
+import tempfile
 import time
 from kitty.controllers.base import BaseController
 
@@ -43,6 +45,7 @@ class SessionServerController(BaseController):
         self._host = host
         self._port = port
         self._server = None
+        self._server_log = None
         self._active = False
 
     def setup(self):
@@ -66,7 +69,9 @@ class SessionServerController(BaseController):
         super(SessionServerController, self).post_test()
         if not self.is_victim_alive():
             if self._server:
-                out, err = self._server.communicate()
+                self._server.wait()
+                self._server_log.seek(0)
+                err = self._server_log.read()
                 self.logger.error(err)
                 self.report.failed("Target does not respond")
                 self.report.add('Traceback', err)
@@ -75,7 +80,10 @@ class SessionServerController(BaseController):
                 self.report.failed("Target does not respond")
 
     def pre_test(self, test_number):
-        self._restart_target()
+        # keep the running target (and its listening socket) between tests,
+        # only start a new one after the previous one went down
+        if self._server is None or self._server.poll() is not None:
+            self._restart_target()
         super(SessionServerController, self).pre_test(test_number)
 
     def _restart_target(self):
@@ -83,18 +91,35 @@ class SessionServerController(BaseController):
         Restart our Target.
         """
         if self._server:
-            if self._server.returncode is None:
+            if self._server.poll() is None:
                 self._server.kill()
-                time.sleep(0.2)
-        self._server = subprocess.Popen("python session_server.py", stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        time.sleep(0.2)
+                self._server.wait()
+        if self._server_log:
+            self._server_log.close()
+        # the target may now live through many tests, so its output goes to
+        # a file rather than to a pipe that nobody drains until it crashes
+        self._server_log = tempfile.TemporaryFile()
+        with open(os.devnull, 'wb') as devnull:
+            self._server = subprocess.Popen("python session_server.py", stdout=devnull, stderr=self._server_log, shell=True)
+        self._wait_for_target()
+
+    def _wait_for_target(self, timeout=2.0, interval=0.02):
+        """
+        Wait until the target accepts connections, or its process exits.
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline and self._server.poll() is None:
+            if self.is_victim_alive():
+                return
+            time.sleep(interval)
 
     def is_victim_alive(self):
         self._active = False
+        # a target process that already exited is down, no need to probe it
+        if self._server and self._server.poll() is not None:
+            return self._active
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(1)
-            s.connect((self._host, self._port))
+            s = socket.create_connection((self._host, self._port), timeout=1)
             s.close()
             self._active = True
         except socket.error:
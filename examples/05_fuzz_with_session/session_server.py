@@ -16,20 +16,32 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with Kitty.  If not, see <http://www.gnu.org/licenses/>.
+import os
 import socket
+import logging
 import threading
 import select
 import errno
-import time
-import struct
-import random
 import traceback
+import multiprocessing
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 from binascii import hexlify
 from kitty.core.kitty_object import KittyObject
 
 host = '0.0.0.0'
 port = 9999
 
+# op_code (1 byte) + session id (2 bytes)
+_HEADER_SIZE = 3
+_OP_GET_SESSION = 1
+_OP_SEND_DATA = 2
+# get_session packets carry an empty session id
+_GET_SESSION = b'\x01\x00\x00'
+_GET_SESSION_OP = _GET_SESSION[:1]
+
 
 def _eintr_retry(func, *args):
     """restart a system call interrupted by EINTR"""
@@ -145,6 +157,7 @@ class BaseServer(KittyObject):
         self.request_handler = request_handler
         self.__is_shut_down = threading.Event()
         self.__shutdown_request = False
+        self._poller = None
 
     def server_activate(self):
         """
@@ -154,6 +167,29 @@ class BaseServer(KittyObject):
 
         pass
 
+    def _wait_for_request(self, timeout):
+        """
+        Wait until a request is ready to be accepted.
+        Uses a persistent epoll/poll object when the platform provides
+        one, and falls back to select otherwise.
+
+        :param timeout: seconds to wait, None to block
+        :return: True if a request is ready
+        """
+        if self._poller is None:
+            if hasattr(select, 'epoll'):
+                self._poller = select.epoll()
+                self._poller.register(self.fileno(), select.EPOLLIN)
+            elif hasattr(select, 'poll'):
+                self._poller = select.poll()
+                self._poller.register(self.fileno(), select.POLLIN)
+            else:
+                r, w, e = _eintr_retry(select.select, [self], [], [], timeout)
+                return bool(r)
+        if hasattr(select, 'epoll') and isinstance(self._poller, select.epoll):
+            return bool(_eintr_retry(self._poller.poll, -1 if timeout is None else timeout))
+        return bool(_eintr_retry(self._poller.poll, None if timeout is None else timeout * 1000))
+
     def serve_forever(self, poll_interval=0.5):
         """
         Handle one request at a time until shutdown.
@@ -164,8 +200,7 @@ class BaseServer(KittyObject):
         self.__is_shut_down.clear()
         try:
             while not self.__shutdown_request:
-                r, w, e = _eintr_retry(select.select, [self], [], [], poll_interval)
-                if self in r:
+                if self._wait_for_request(poll_interval):
                     self._handle_request_noblock()
 
         finally:
@@ -193,8 +228,7 @@ class BaseServer(KittyObject):
             timeout = self.timeout
         elif self.timeout is not None:
             timeout = min(timeout, self.timeout)
-        fd_sets = _eintr_retry(select.select, [self], [], [], timeout)
-        if not fd_sets[0]:
+        if not self._wait_for_request(timeout):
             self.handle_timeout()
             return
         self._handle_request_noblock()
@@ -242,7 +276,10 @@ class BaseServer(KittyObject):
         Called to clean-up the server.
         May be overridden.
         """
-        pass
+        if self._poller is not None:
+            if hasattr(self._poller, 'close'):
+                self._poller.close()
+            self._poller = None
 
     def finish_request(self, request, client_address):
         """
@@ -283,7 +320,13 @@ class TCPServer(BaseServer):
     socket_type = socket.SOCK_STREAM
     request_queue_size = 5
     allow_reuse_address = False
+    #: let several listening sockets share the port (where SO_REUSEPORT is supported)
+    allow_reuse_port = False
+    #: disable Nagle's algorithm on accepted sockets, responses are small
+    tcp_nodelay = True
     daemon_threads = True
+    #: number of worker threads that process requests, None for twice the number of CPUs
+    max_workers = None
 
     def __init__(self, name, server_address, request_handler, logger=None):
         '''
@@ -295,6 +338,8 @@ class TCPServer(BaseServer):
 
         super(TCPServer, self).__init__(name, server_address, request_handler, logger)
         self.socket = socket.socket(self.address_family, self.socket_type)
+        self._requests = None
+        self._workers = []
 
     def server_bind(self):
         """
@@ -303,6 +348,8 @@ class TCPServer(BaseServer):
 
         if self.allow_reuse_address:
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.allow_reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind(self.server_address)
 
     def server_activate(self):
@@ -317,6 +364,13 @@ class TCPServer(BaseServer):
         Called to clean-up the server.
         """
 
+        super(TCPServer, self).server_close()
+        if self._requests is not None:
+            # may run on a worker thread (handle_error), so don't join here
+            for _ in self._workers:
+                self._requests.put(None)
+            self._requests = None
+            self._workers = []
         self.socket.close()
 
     def fileno(self):
@@ -332,7 +386,10 @@ class TCPServer(BaseServer):
         Get the request and client address from the socket.
         """
 
-        return self.socket.accept()
+        request, client_address = self.socket.accept()
+        if self.tcp_nodelay:
+            request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return request, client_address
 
     def shutdown_request(self, request):
         """
@@ -368,13 +425,29 @@ class TCPServer(BaseServer):
 
     def process_request(self, request, client_address):
         """
-        Start a new thread to process the request.
+        Hand the request to a worker thread.
         """
 
-        t = threading.Thread(target=self.process_request_thread,
-                             args=(request, client_address))
-        t.daemon = self.daemon_threads
-        t.start()
+        if self._requests is None:
+            self._requests = queue.Queue()
+            for i in range(self.max_workers or multiprocessing.cpu_count() * 2):
+                t = threading.Thread(target=self._process_requests, args=(self._requests,),
+                                     name='%s-worker-%d' % (self.name, i))
+                t.daemon = self.daemon_threads
+                t.start()
+                self._workers.append(t)
+        self._requests.put((request, client_address))
+
+    def _process_requests(self, requests):
+        """
+        Worker thread loop, process queued requests until a None arrives.
+        """
+
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            self.process_request_thread(*item)
 
 
 class SessionHandler(BaseRequestHandler):
@@ -431,21 +504,41 @@ class SessionHandler(BaseRequestHandler):
         '''
 
         # Create 2 byte specific session for each request
-        self._session = struct.pack('H', random.randrange(65535))
+        self._session = os.urandom(2)
+        self._buf = bytearray(4096)
+        self._view = memoryview(self._buf)
         self._recv_data = None
         self._resp_data = None
+        # op_code -> packet handler, a handler returns False to end the connection
+        self._dispatch = {
+            _OP_GET_SESSION: self._on_get_session,
+            _OP_SEND_DATA: self._on_send_data,
+        }
         super(SessionHandler, self).__init__(name, request, client_address, server, logger)
 
     def _send_session(self):
-        self._resp_data = b'\x01' + self._session
-        self.logger.info('Session id is: %s' % hexlify(self._session).decode())
-        self.request.send(self._resp_data)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info('Session id is: %s', hexlify(self._session).decode())
+        self._send_parts([_GET_SESSION_OP, self._session])
         self._cleanup()
 
     def _send_data(self, data):
-        self.request.send(data)
+        self.request.sendall(data)
         self._cleanup()
 
+    def _send_parts(self, parts):
+        '''
+        Send a response built of several buffers, gathered in a single
+        sendmsg call where available.
+        '''
+        if hasattr(self.request, 'sendmsg'):
+            sent = self.request.sendmsg(parts)
+            if sent == sum(len(part) for part in parts):
+                return
+            self.request.sendall(b''.join(parts)[sent:])
+        else:
+            self.request.sendall(b''.join(parts))
+
     def _crash(self):
         raise Exception("Congratulations you successful crash session server!")
 
@@ -465,42 +558,64 @@ class SessionHandler(BaseRequestHandler):
         self._recv_data = None
         self._resp_data = None
 
+    def _recv_frame(self):
+        '''
+        Receive a packet into the handler's buffer, waiting for the rest of
+        the header if it arrived in pieces.
+
+        :return: memoryview of the received packet, empty if the connection was closed
+        '''
+        n = self.request.recv_into(self._view)
+        while 0 < n < _HEADER_SIZE:
+            received = self.request.recv_into(self._view[n:], _HEADER_SIZE - n)
+            if not received:
+                return self._view[:0]
+            n += received
+        return self._view[:n]
+
     def _close(self):
         self.request.close()
         self.finish()
 
+    def _on_get_session(self, data):
+        if data != _GET_SESSION:
+            return self._on_bad_packet(data)
+        self._send_session()
+        return True
+
+    def _on_send_data(self, data):
+        if not self._check_session(data):
+            self.logger.info('session is incorrect')
+            self._send_data(b'session is incorrect')
+            self._close()
+            return False
+        self.logger.info('session is correct')
+        if self._check_crash(data):
+            self._crash()
+            return False
+        self._send_data(data)
+        return True
+
+    def _on_bad_packet(self, data):
+        self.logger.info('Packet format is incorrect')
+        self._close()
+        return False
+
     def handle(self):
+        # self.request is the TCP socket connected to the client,
+        # it is set once, so the only way out of the loop is EOF or a close
+        if not self.request:
+            return
         while True:
-            # self.request is the TCP socket connected to the client
-            if self.request:
-                self._recv_data = self.request.recv(1024).strip()
-                if self._recv_data:
-                    self.logger.debug('Received data is: %s' % hexlify(self._recv_data).decode())
-                    # Check is get_session packet
-                    if self._recv_data == b'\x01\x00\x00':
-                        self._send_session()
-                    # Check is send_data packet
-                    elif self._recv_data[0] == b'\x02':
-                        if self._check_session(self._recv_data):
-                            self.logger.info('session is correct')
-                            if self._check_crash(self._recv_data):
-                                self._crash()
-                                break
-                            else:
-                                self._send_data(self._recv_data)
-                        else:
-                            self.logger.info('session is incorrect')
-                            self._send_data('session is incorrect')
-                            self._close()
-                            break
-                    else:
-                        self.logger.info('Packet format is incorrect')
-                        self._close()
-                        break
-                else:
-                    self._close()
-                    break
-            else:
+            self._recv_data = self._recv_frame()
+            if not self._recv_data:
+                self._close()
+                break
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug('Received data is: %s', hexlify(self._recv_data).decode())
+            # dispatch by op_code, indexing the bytearray gives an int on both python 2 and 3
+            handler = self._dispatch.get(self._buf[0], self._on_bad_packet)
+            if not handler(self._recv_data):
                 break
 
 
@@ -522,9 +637,9 @@ class SessionServer(TCPServer):
         super(SessionServer, self).__init__(name, server_address, request_handler, logger)
 
     def stop(self):
+        # shutdown() returns once serve_forever has exited, nothing to wait for after it
         self.shutdown()
         self.server_close()
-        time.sleep(1)
 
     def start(self):
         self.server_bind()
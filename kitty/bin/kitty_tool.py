@@ -36,6 +36,10 @@ Options:
     --field-path -p FIELDPATH   generate mutations only for the field with the given path
     --verbose -v            verbose output
     --filename-format -f FORMAT  format for generated file names [default: %(template)s.%(index)s.bin]
+    --jobs -j JOBS          number of worker processes used to generate the mutations [default: 1]
+    --combined-metadata     store the payload and its metadata in a single file
+    --no-metadata           do not generate metadata for the mutations
+    --archive -a ARCHIVE    write the mutations into a single tar archive instead of OUTDIR
     --version               print version and exit
     --help -h               print this help and exit
 
@@ -45,16 +49,99 @@ File name formats:
     The available keywords are:
         template - the template name
         index - the template index
+
+Combined metadata files:
+    With --combined-metadata, each mutation is stored in a single file:
+        u32 payload length | payload | u32 metadata length | metadata (JSON)
+    lengths are big endian. Use read_combined_file to parse such a file.
 '''
+import io
 import os
+import re
 import sys
-import types
+import json
+import time
+import struct
+import tarfile
 import logging
+import multiprocessing
 from pkg_resources import get_distribution
-from json import dumps
 import docopt
 import traceback
 from kitty.model import Template
+try:
+    from importlib.util import spec_from_file_location, module_from_spec
+except ImportError:
+    import imp
+    spec_from_file_location = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_FORMAT_KEY = re.compile(r'%(?:%|\((template|index)\)([#0\- +]*\d*(?:\.\d+)?[hlL]?[diouxXeEfFgGcrsa]))')
+
+
+def compile_filename_format(fmt, template_name):
+    '''
+    Specialize a filename format for a single template,
+    so only the index is left to format for each mutation.
+
+    :param fmt: filename format (see "File name formats")
+    :param template_name: name of the template
+    :return: function(index) -> filename
+    '''
+    index_count = [0]
+
+    def specialize(match):
+        key, spec = match.groups()
+        if key is None:
+            return '%%'
+        if key == 'template':
+            return (('%' + spec) % template_name).replace('%', '%%')
+        index_count[0] += 1
+        return '%' + spec
+
+    index_fmt = _FORMAT_KEY.sub(specialize, fmt)
+    if index_count[0] == 1:
+        return index_fmt.__mod__
+    return lambda index: index_fmt % ((index,) * index_count[0])
+
+
+def dump_metadata(info):
+    '''
+    Serialize mutation metadata to JSON, using orjson when it is installed.
+    Falls back to the json module for objects that orjson cannot handle
+    (e.g. integers wider than 64 bits).
+    Both paths produce the same bytes: UTF-8, indent of 2, sorted keys.
+
+    :param info: metadata dictionary
+    :rtype: ``bytes``
+    '''
+    if orjson is not None:
+        try:
+            return orjson.dumps(info, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(info, indent=2, sort_keys=True, ensure_ascii=False, separators=(',', ': ')).encode('utf-8')
+
+
+def read_combined_file(path):
+    '''
+    Read a file that was generated with --combined-metadata
+
+    :param path: path to the file
+    :return: tuple of (payload, metadata)
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    (payload_len,) = struct.unpack_from('>I', data, 0)
+    payload = data[4:4 + payload_len]
+    (metadata_len,) = struct.unpack_from('>I', data, 4 + payload_len)
+    metadata_start = 8 + payload_len
+    metadata = json.loads(data[metadata_start:metadata_start + metadata_len].decode('utf-8'))
+    return payload, metadata
 
 
 def get_logger(opts):
@@ -70,6 +157,7 @@ class FileIterator(object):
         self.filename = filename
         self.handler = handler
         self.logger = logger
+        self._module = None
 
     def check_file(self):
         if not os.path.exists(self.filename):
@@ -80,29 +168,169 @@ class FileIterator(object):
     def iterate(self):
         self.check_file()
         self.handler.start()
-        dirpath, filename = os.path.split(self.filename)
-        modulename = filename[:-3]
-        if dirpath in sys.path:
-            sys.path.remove(dirpath)
-        sys.path.insert(0, dirpath)
-        module = __import__(modulename)
-        member_names = dir(module)
-        for name in member_names:
-            attr = getattr(module, name)
-            if isinstance(attr, Template):
-                self.handler.handle(attr)
-            elif isinstance(attr, list):
-                for mem in attr:
-                    if isinstance(mem, Template):
-                        self.handler.handle(mem)
+        try:
+            wanted_names = self.handler.wanted_names
+            for template in self._collect(self._load_module()):
+                if wanted_names is None or template.get_name() in wanted_names:
+                    self.handler.handle(template)
+        finally:
+            self.handler.stop()
+
+    def _load_module(self):
+        '''
+        :return: the module in self.filename, executed once per iterator
+        '''
+        if self._module is None:
+            dirpath, filename = os.path.split(self.filename)
+            modulename = filename[:-3]
+            # keep sibling imports of the template file working
+            if dirpath not in sys.path:
+                sys.path.insert(0, dirpath)
+            if spec_from_file_location is None:
+                self._module = imp.load_source(modulename, self.filename)
+            else:
+                spec = spec_from_file_location(modulename, self.filename)
+                module = module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._module = module
+        return self._module
+
+    def _collect(self, module):
+        '''
+        :return: list of templates in the module (globals, lists and dicts)
+        '''
+        templates = []
+        for attr in list(module.__dict__.values()):
+            if isinstance(attr, list):
+                members = attr
             elif isinstance(attr, dict):
-                for k in attr:
-                    if isinstance(attr[k], Template):
-                        self.handler.handle(attr[k])
+                members = attr.values()
+            else:
+                members = (attr,)
+            templates.extend(member for member in members if isinstance(member, Template))
+        return templates
+
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+_writev = getattr(os, 'writev', None)
+
+
+class DirectoryWriter(object):
+    '''
+    Write output files into the output directory.
+    The directory is opened once and files are created relative to it,
+    so the directory path is not resolved again for each file.
+    '''
+
+    def __init__(self, outdir):
+        '''
+        :param outdir: output directory
+        '''
+        self.outdir = outdir
+        self._path_prefix = os.path.join(outdir, '')
+        self._dirfd = None
+        if os.open in getattr(os, 'supports_dir_fd', ()):
+            self._dirfd = os.open(outdir, os.O_RDONLY | os.O_DIRECTORY | getattr(os, 'O_CLOEXEC', 0))
+
+    def submit(self, filename, data):
+        '''
+        Write a file
+
+        :param filename: name of the file, relative to the output directory
+        :type data: ``bytes`` or ``list`` of ``bytes``
+        :param data: content of the file, or a list of chunks to write one after the other
+        '''
+        if self._dirfd is None:
+            fd = os.open(self._path_prefix + filename, _OPEN_FLAGS, 0o644)
+        else:
+            fd = os.open(filename, _OPEN_FLAGS, 0o644, dir_fd=self._dirfd)
+        try:
+            written = 0
+            if not isinstance(data, list):
+                chunks = (data,)
+            elif _writev is None:
+                chunks = (b''.join(data),)
+            else:
+                chunks = data
+                written = _writev(fd, chunks)
+            # write whatever was not written yet, usually nothing is left after writev
+            for chunk in chunks:
+                if written >= len(chunk):
+                    written -= len(chunk)
+                    continue
+                view = memoryview(chunk)[written:]
+                written = 0
+                while view:
+                    view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
+    def close(self):
+        '''
+        Release the output directory
+        '''
+        if self._dirfd is not None:
+            os.close(self._dirfd)
+            self._dirfd = None
+
+
+class ArchiveWriter(object):
+    '''
+    Stream output files into a single tar archive
+    '''
+
+    def __init__(self, path, bufsize=1 << 20):
+        '''
+        :param path: path of the tar archive
+        :param bufsize: size of the archive write buffer (default: 1MiB)
+        '''
+        self.path = path
+        self._tar = tarfile.open(path, 'w|', bufsize=bufsize)
+        self._mtime = int(time.time())
+
+    def submit(self, filename, data):
+        '''
+        Add a file to the archive
+
+        :param filename: name of the file in the archive
+        :type data: ``bytes`` or ``list`` of ``bytes``
+        :param data: content of the file, or a list of chunks to write one after the other
+        '''
+        if isinstance(data, list):
+            data = b''.join(data)
+        info = tarfile.TarInfo(name=filename)
+        info.size = len(data)
+        info.mtime = self._mtime
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        '''
+        Finish and close the archive
+        '''
+        self._tar.close()
+
+
+class _CollectingWriter(object):
+    '''
+    Keep output files in memory, used by worker processes to pass them
+    back to an :class:`ArchiveWriter` in the main process
+    '''
+
+    def __init__(self):
+        self.files = []
+
+    def submit(self, filename, data):
+        self.files.append((filename, data))
+
+    def close(self):
+        pass
 
 
 class Handler(object):
 
+    #: names of the templates the handler is interested in, None for all templates
+    wanted_names = None
+
     def __init__(self, opts, logger):
         self.opts = opts
         self.logger = logger
@@ -113,6 +341,9 @@ class Handler(object):
     def handle(self, template):
         pass
 
+    def stop(self):
+        pass
+
 
 def to_int(val, name):
     if val is None:
@@ -133,39 +364,112 @@ class FileGeneratorHandler(Handler):
         self.skip = to_int(opts['--skip'], 'skip')
         self.count = to_int(opts['--count'], 'count')
         self.template_names = opts['<TEMPLATE>']
+        self.wanted_names = frozenset(self.template_names)
         self.filename_format = opts['--filename-format']
+        self.jobs = to_int(opts.get('--jobs') or 1, 'jobs')
+        self.combined_metadata = opts.get('--combined-metadata', False)
+        self.write_metadata = not opts.get('--no-metadata', False)
+        self.archive = opts.get('--archive')
         try:
-            self.filename_format % {
-                'template': 'hello',
-                'index': 1
-            }
+            compile_filename_format(self.filename_format, 'hello')(1)
         except:
             raise Exception('invalid filename template: %s' % (self.filename_format))
 
     def start(self):
+        if self.archive:
+            if os.path.exists(self.archive):
+                raise Exception('cannot create archive %s, already exists' % self.archive)
+            self.abs_outdir = os.path.abspath(self.archive)
+            self.writer = ArchiveWriter(self.archive)
+            return
         if os.path.exists(self.outdir):
             raise Exception('cannot create directory %s, already exists' % self.outdir)
         os.mkdir(self.outdir)
+        self.abs_outdir = os.path.abspath(self.outdir)
+        self.writer = DirectoryWriter(self.outdir)
+
+    def stop(self):
+        self.writer.close()
 
     def handle(self, template):
         self.template = template
         template_name = template.get_name()
         if template_name in self.template_names:
-            self.logger.info('Generating mutation files from template %s into %s' % (template_name, os.path.abspath(self.outdir)))
+            self.logger.info('Generating mutation files from template %s into %s' % (template_name, self.abs_outdir))
             self._set_current_template_params(template)
             self.logger.info('Mutation range: %s-%s (total: %d)' % (self.skip, self.end_index, self.end_index - self.skip + 1))
             self._progress_init()
-            while template.mutate():
-                template_filename = self.filename_format % {'template': template_name, 'index': template._current_index}
-                self._store_template(template, template_filename)
-                metadata_filename = template_filename + '.metadata'
-                info = template.get_info()
-                self._store_metadata(info, metadata_filename)
-                self._progress_print(template._current_index, info)
-                if template._current_index >= self.end_index:
-                    break
+            if self.jobs > 1:
+                self._generate_parallel(template)
+            else:
+                self._generate(template, template_name, self.end_index, self._progress_print)
             self._progress_finalize()
 
+    def _generate(self, template, template_name, end_index, progress=None, template_hash=None):
+        count = 0
+        format_filename = compile_filename_format(self.filename_format, template_name)
+        # bind everything used per mutation to locals before entering the loop
+        mutate = template.mutate
+        get_info = template.get_info
+        if template_hash is not None:
+            # the hash is not stable across processes, use the one of the main process
+            def get_info():
+                info = template.get_info()
+                info['hash'] = template_hash
+                return info
+        render_payload = self._render_payload
+        submit = self.writer.submit
+        store_metadata = self._store_metadata
+        store_combined = self._store_combined if self.combined_metadata else None
+        write_metadata = self.write_metadata
+        info = {}
+        while mutate():
+            index = template._current_index
+            template_filename = format_filename(index)
+            payload = render_payload(template)
+            if not write_metadata:
+                submit(template_filename, payload)
+            elif store_combined:
+                info = get_info()
+                store_combined(payload, info, template_filename)
+            else:
+                info = get_info()
+                submit(template_filename, payload)
+                store_metadata(info, template_filename + '.metadata')
+            count += 1
+            if progress:
+                progress(index, info)
+            if index >= end_index:
+                break
+        return count
+
+    def _generate_parallel(self, template):
+        template_name = template.get_name()
+        template_hash = template.hash()
+        total = self.end_index - self.skip + 1
+        chunk_size = max(1, -(-total // (self.jobs * 4)))
+        if self.archive:
+            # workers send archived files back to the main process, keep each batch small
+            chunk_size = min(chunk_size, _ARCHIVE_CHUNK_SIZE)
+        chunks = [
+            (self.opts, template_name, template_hash, start, min(start + chunk_size, self.end_index + 1) - 1)
+            for start in range(self.skip, self.end_index + 1, chunk_size)
+        ]
+        if hasattr(multiprocessing, 'get_context'):
+            pool = multiprocessing.get_context('spawn').Pool(self.jobs)
+        else:
+            pool = multiprocessing.Pool(self.jobs)
+        try:
+            done = 0
+            for count, files in pool.imap_unordered(_generate_chunk, chunks):
+                for filename, data in files:
+                    self.writer.submit(filename, data)
+                done += count
+                self._progress_print(self.skip + done - 1, {})
+        finally:
+            pool.close()
+            pool.join()
+
     def _set_current_template_params(self, template):
         template.skip(self.skip)
         self.end_index = template.num_mutations() if not self.count else self.skip + self.count
@@ -175,32 +479,38 @@ class FileGeneratorHandler(Handler):
         if self.skip > template.num_mutations():
             raise Exception('No mutations to generate, you skipped over the entire template')
 
-    def _store_template(self, template, filename):
-        with open(os.path.join(self.outdir, filename), 'wb') as f:
-            f.write(template.render().tobytes())
+    def _render_payload(self, template):
+        rendered = template.render()
+        if rendered.len % 8:
+            return rendered.tobytes()
+        return rendered.bytes
 
     def _store_metadata(self, info, filename):
-        with open(os.path.join(self.outdir, filename), 'wb') as f:
-            f.write(dumps(info, indent=4, sort_keys=True))
+        self.writer.submit(filename, dump_metadata(info))
+
+    def _store_combined(self, payload, info, filename):
+        metadata = dump_metadata(info)
+        self.writer.submit(filename, [struct.pack('>I', len(payload)), payload, struct.pack('>I', len(metadata)), metadata])
 
     def _progress_init(self):
         self.total = (self.end_index - self.skip)
         self.step = 100.0 / self.total
         self.max_line_length = 0
+        self.last_percent = -1
 
     def _progress_print(self, current_index, info):
         tests_left = (self.end_index - current_index)
         percent = int((self.total - tests_left) * self.step)
+        if percent == self.last_percent and (current_index - self.skip) & 0x3ff:
+            return
+        self.last_percent = percent
         out_line = ''
         out_line += '\r%3d%%' % (percent)
         out_line += ' %d/%d' % (current_index - self.skip + 1, self.end_index - self.skip + 1)
         if 'field/path' in info:
             out_line += ' %s' % (info['field/path'])
-        if len(out_line) > self.max_line_length:
-            max_line_length = len(out_line)
-        else:
-            max_line_length = self.max_line_length
-        out_line += ' ' * (max_line_length - len(out_line))
+        self.max_line_length = max(self.max_line_length, len(out_line))
+        out_line += ' ' * (self.max_line_length - len(out_line))
         sys.stdout.write(out_line)
         sys.stdout.flush()
 
@@ -209,10 +519,68 @@ class FileGeneratorHandler(Handler):
         sys.stdout.flush()
 
 
+class TemplateFinderHandler(Handler):
+    '''
+    Find a single template by its name
+    '''
+
+    def __init__(self, template_name):
+        super(TemplateFinderHandler, self).__init__(None, None)
+        self.template_name = template_name
+        self.wanted_names = frozenset([template_name])
+        self.template = None
+
+    def handle(self, template):
+        if self.template is None:
+            self.template = template
+
+
+#: maximal number of mutations a worker sends back to the main process at once, when writing an archive
+_ARCHIVE_CHUNK_SIZE = 256
+
+# (template file, template name) -> template, loaded once per worker process
+_worker_templates = {}
+
+
+def _generate_chunk(args):
+    '''
+    Generate the mutations in the range [start, end] of a template.
+    Runs in a worker process, so it loads the template file on its own.
+    The template is kept between chunks, chunks are handed out in order,
+    so usually it only has to skip forward to the start of the next one.
+
+    :return: tuple of (number of generated mutations, files to write in the main process)
+    '''
+    opts, template_name, template_hash, start, end = args
+    key = (opts['<FILE>'], template_name)
+    template = _worker_templates.get(key)
+    if template is None:
+        finder = TemplateFinderHandler(template_name)
+        FileIterator(opts['<FILE>'], finder, None).iterate()
+        template = _worker_templates[key] = finder.template
+    if template._current_index >= start:
+        template.reset()
+    template.skip(start - template._current_index - 1)
+    handler = FileGeneratorHandler(opts, None)
+    if handler.archive:
+        handler.writer = _CollectingWriter()
+    else:
+        handler.writer = DirectoryWriter(handler.outdir)
+    try:
+        count = handler._generate(template, template_name, end, template_hash=template_hash)
+    finally:
+        handler.writer.close()
+    return count, getattr(handler.writer, 'files', ())
+
+
 class ListHandler(Handler):
 
+    def start(self):
+        # plain output, no need to go through the logging machinery per template
+        self._say = sys.stderr.write
+
     def handle(self, template):
-        self.logger.info('%-80s %s' % (template.get_name(), template.num_mutations()))
+        self._say('%-80s %s\n' % (template.get_name(), template.num_mutations()))
 
 
 def _main():
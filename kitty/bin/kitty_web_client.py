@@ -29,15 +29,19 @@ Options:
     -p --port <port>        kitty web server port [default: 26000]
 '''
 import os
+import sys
 import json
 from base64 import b64decode
 from binascii import hexlify
+from multiprocessing.pool import ThreadPool
 import requests
 import docopt
 
 
 class KittyWebClientApi(object):
 
+    max_workers = 16
+
     def __init__(self, host, port):
         '''
         :param host: server hostname
@@ -45,12 +49,20 @@ class KittyWebClientApi(object):
         :param reports_dir: directory to store reports
         '''
         self.url = 'http://%(host)s:%(port)s' % {'host': host, 'port': port}
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers))
+
+    def close(self):
+        '''
+        Close the connections to the server
+        '''
+        self.session.close()
 
     def get_stats(self):
         '''
         Get kitty stats as a dictionary
         '''
-        resp = requests.get('%s/api/stats.json' % self.url)
+        resp = self.session.get('%s/api/stats.json' % self.url)
         assert(resp.status_code == 200)
         return resp.json()
 
@@ -67,20 +79,68 @@ class KittyWebClientApi(object):
         :return dictionary of id/report (json string)
         '''
         res = {}
-        for rid in report_ids:
-            print('Fetching report %d' % rid)
-            resp = requests.get('%s/api/report?report_id=%d' % (self.url, rid))
-            if resp.status_code != 200:
+        for rid, report in self._imap(self._get_report, report_ids):
+            if report is None:
                 print('[!] failed to fetch report %d' % rid)
             else:
-                res[rid] = resp.text
+                print('Fetched report %d' % rid)
+                res[rid] = report
         return res
 
+    def store_reports(self, report_ids, folder):
+        '''
+        Download reports by list of ids directly into files,
+        without keeping them in memory
+        :param report_ids: list of reports ids
+        :param folder: directory to store the reports in
+        :return list of ids of the stored reports
+        '''
+        stored = []
+        for rid, ok in self._imap(lambda rid: self._store_report(rid, folder), report_ids):
+            if ok:
+                print('Stored report %d' % rid)
+                stored.append(rid)
+            else:
+                print('[!] failed to fetch report %d' % rid)
+        return stored
+
+    def _imap(self, func, items):
+        if not items:
+            return
+        pool = ThreadPool(min(self.max_workers, len(items)))
+        try:
+            for res in pool.imap_unordered(func, items):
+                yield res
+        finally:
+            pool.close()
+            pool.join()
+
+    def _get_report(self, rid):
+        resp = self.session.get(self._report_url(rid))
+        if resp.status_code != 200:
+            return rid, None
+        return rid, resp.text
+
+    def _store_report(self, rid, folder):
+        resp = self.session.get(self._report_url(rid), stream=True)
+        try:
+            if resp.status_code != 200:
+                return rid, False
+            with open(os.path.join(folder, 'report_%d.json' % (rid)), 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+        finally:
+            resp.close()
+        return rid, True
+
+    def _report_url(self, rid):
+        return '%s/api/report?report_id=%d' % (self.url, rid)
+
     def pause(self):
-        requests.get('%s/api/action/pause' % (self.url))
+        self.session.get('%s/api/action/pause' % (self.url))
 
     def resume(self):
-        requests.get('%s/api/action/resume' % (self.url))
+        self.session.get('%s/api/action/resume' % (self.url))
 
 
 def cmd_report_store(options, web):
@@ -89,18 +149,17 @@ def cmd_report_store(options, web):
     if not os.path.exists(folder):
         os.mkdir(folder)
     ids = [x[0] for x in web.get_report_list()]
-    reports = web.get_reports(ids)
-    for (rid, report) in reports.items():
-        with open(os.path.join(folder, 'report_%d.json' % (rid)), 'w') as f:
-            f.write(report)
+    web.store_reports(ids, folder)
 
 
 def cmd_report_show(options):
     filenames = options['<file>']
+    out = []
     for filename in filenames:
         with open(filename, 'r') as f:
             report = json.load(f)['report']
-            print_report(report, depth=0)
+            print_report(report, 0, out)
+    sys.stdout.write(''.join(out))
 
 
 def _pad(depth, with_key):
@@ -111,14 +170,14 @@ def _pad(depth, with_key):
     return ''
 
 
-def indent_print(depth, key, val=None):
+def indent_print(depth, key, out, val=None):
     if val is None:
-        print(_pad(depth, True) + key)
+        out.append(_pad(depth, True) + key + '\n')
     else:
         pre_len = len(key)
         first = True
         for line in val.split('\n'):
-            print(_pad(depth, with_key=first) + key + line)
+            out.append(_pad(depth, with_key=first) + key + line + '\n')
             if first:
                 key = ' ' * pre_len
                 first = False
@@ -128,49 +187,69 @@ def format_key(k):
     return k.replace('_', ' ')
 
 
-def print_entry(k, v, depth, decode_str):
+def print_entry(k, v, depth, decode_str, out):
     if isinstance(v, list):
-        indent_print(depth, '%-20s' % (k + ':'))
+        indent_print(depth, '%-20s' % (k + ':'), out)
         for i in range(len(v)):
-            print_entry('%s' % i, v, depth + 1, decode_str)
+            print_entry('%s' % i, v[i], depth + 1, decode_str, out)
     elif isinstance(v, dict):
-        indent_print(depth, '%-20s' % (k + ':'))
+        indent_print(depth, '%-20s' % (k + ':'), out)
         for subk in sorted(v):
-            print_entry(subk, v[subk], depth + 1, decode_str)
+            print_entry(subk, v[subk], depth + 1, decode_str, out)
     else:
-        print_key_val(k, v, depth, decode_str)
+        print_key_val(k, v, depth, decode_str, out)
 
 
-def print_key_val(k, val, depth, decode_str):
-    if isinstance(val, str) and decode_str:
-        try:
-            val = b64decode(val).decode()
-        except:
-            pass
+def _decode_str(val):
+    '''
+    Decode a base64 encoded report string.
+    Binary (non UTF-8) data is returned as hex,
+    values that are not base64 at all are returned as is.
+    '''
+    try:
+        raw = b64decode(val)
+    except (TypeError, ValueError):
+        return val
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return hexlify(raw).decode()
+
+
+def print_key_val(k, val, depth, decode_str, out):
+    if decode_str and isinstance(val, str):
+        val = _decode_str(val)
     key = format_key(k)
     try:
-        indent_print(depth, '%-20s' % (key + ':'), '%s' % val)
+        indent_print(depth, '%-20s' % (key + ':'), out, '%s' % val)
     except UnicodeDecodeError:
-        indent_print(depth, '%-20s' % (key + ':'), '%s' % hexlify(val).decode())
+        indent_print(depth, '%-20s' % (key + ':'), out, '%s' % hexlify(val).decode())
 
 
-def print_report(report, depth):
+def print_report(report, depth, out):
+    '''
+    Format a report and its sub-reports into a list of output lines
+
+    :param report: report dictionary
+    :param depth: indentation depth
+    :param out: list to append the formatted lines to
+    '''
     # next two fields should not be printed as normal fields
     name = b64decode(report['name']).decode()
     del report['name']
     sub_reports = report['sub_reports']
     del report['sub_reports']
     # print report header
-    indent_print(depth, '***** Report: %s *****' % name)
+    indent_print(depth, '***** Report: %s *****' % name, out)
     # print entries (excluding sub-reports)
     for k in sorted(report.keys()):
         if k not in sub_reports:
             val = report[k]
-            print_entry(k, val, depth, True)
-    print('')
+            print_entry(k, val, depth, True, out)
+    out.append('\n')
     # print sub-reports
     for sr in sorted(sub_reports):
-        print_report(report[sr], depth)
+        print_report(report[sr], depth, out)
 
 
 def cmd_info(options, web):
@@ -184,11 +263,10 @@ def cmd_info(options, web):
 
     print('--- Current Test Info ---')
     info = resp['current_test']
-    # max_len = max(len(k) for k in info.keys())
+    out = []
     for k, v in sorted(info.items()):
-        print_entry(k, v, 0, False)
-        # pad = ' ' * (max_len - len(k))
-        # print('%s:%s %s' % (k, pad, v))
+        print_entry(k, v, 0, False, out)
+    sys.stdout.write(''.join(out))
 
     if options['--verbose']:
         reports = resp['reports_extended']
@@ -200,17 +278,20 @@ def cmd_info(options, web):
 def _main():
     options = docopt.docopt(__doc__)
     web = KittyWebClientApi(options['--host'], int(options['--port']))
-    if options['reports']:
-        if options['store']:
-            cmd_report_store(options, web)
-        elif options['show']:
-            cmd_report_show(options)
-    elif options['info']:
-        cmd_info(options, web)
-    elif options['pause']:
-        web.pause()
-    elif options['resume']:
-        web.resume()
+    try:
+        if options['reports']:
+            if options['store']:
+                cmd_report_store(options, web)
+            elif options['show']:
+                cmd_report_show(options)
+        elif options['info']:
+            cmd_info(options, web)
+        elif options['pause']:
+            web.pause()
+        elif options['resume']:
+            web.resume()
+    finally:
+        web.close()
 
 
 if __name__ == '__main__':
@@ -68,7 +68,11 @@ class KittyActorInterface(KittyObject):
         :param test_number: current test number
         '''
         self.test_number = test_number
-        self.report = Report(self.name)
+        if self.report is None:
+            self.report = Report(self.name)
+        else:
+            # the previous report was already collected, reuse it
+            self.report.clear()
         self.report.add('start_time', time.time())
         self.report.add('test_number', self.test_number)
         self.report.add('state', 'pre_test')
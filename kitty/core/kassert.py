@@ -18,9 +18,15 @@
 This module provides various assertion functions used by kitty,
 not that important, but makes the life easier.
 Useful for making assertions that throw :class:`~kitty.core.KittyException`
+
+Like the ``assert`` statement, the assertions are skipped when python runs
+with optimizations (``-O``).
 '''
 from kitty.core import KittyException
 
+#: whether assertions are performed, False when running with ``python -O``
+KITTY_ASSERT_ENABLED = __debug__
+
 
 def is_of_types(obj, the_types):
     '''
@@ -28,7 +34,7 @@ def is_of_types(obj, the_types):
     :param the_types: iterable of types, or a signle type
     :raise: an exception if obj is not an instance of types
     '''
-    if not isinstance(obj, the_types):
+    if KITTY_ASSERT_ENABLED and not isinstance(obj, the_types):
         raise KittyException('object type (%s) is not one of (%s)' % (type(obj), the_types))
 
 
@@ -37,7 +43,8 @@ def is_int(obj):
     :param obj: object to assert
     :raise: an exception if obj is not an int type
     '''
-    is_of_types(obj, int)
+    if KITTY_ASSERT_ENABLED and not isinstance(obj, int):
+        raise KittyException('object type (%s) is not one of (%s)' % (type(obj), int))
 
 
 def is_in(obj, it):
@@ -46,7 +53,7 @@ def is_in(obj, it):
     :param it: iterable of elements we assert obj is in
     :raise: an exception if obj is in an iterable
     '''
-    if obj not in it:
+    if KITTY_ASSERT_ENABLED and obj not in it:
         raise KittyException('(%s) is not in %s' % (obj, it))
 
 
@@ -55,5 +62,5 @@ def not_none(obj):
     :param obj: object to assert
     :raise: an exception if obj is not None
     '''
-    if obj is None:
+    if KITTY_ASSERT_ENABLED and obj is None:
         raise KittyException('object is None')
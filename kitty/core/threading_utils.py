@@ -47,9 +47,13 @@ class LoopFuncThread(threading.Thread):
     FuncThread is a thread wrapper to create thread from a function
     '''
 
+    #: return value of the function that ends the loop
+    STOP = object()
+
     def __init__(self, func, *args):
         '''
-        :param func: function to be call in a loop in this thread
+        :param func: function to be call in a loop in this thread,
+            the loop ends when it returns :attr:`LoopFuncThread.STOP`
         :param args: arguments for the function
         '''
         super(LoopFuncThread, self).__init__()
@@ -67,10 +71,11 @@ class LoopFuncThread(threading.Thread):
 
     def run(self):
         '''
-        run the the function in a loop until stoped
+        run the the function in a loop until stoped, or until it returns LoopFuncThread.STOP
         '''
-        while not self._stop_event.isSet():
-            self._func(*self._args)
+        while not self._stop_event.is_set():
+            if self._func(*self._args) is LoopFuncThread.STOP:
+                break
 
     def stop(self):
         '''
@@ -80,5 +85,5 @@ class LoopFuncThread(threading.Thread):
         if self._func_stop_event is not None:
             self._func_stop_event.set()
         self.join(timeout=1)
-        if self.isAlive():
+        if self.is_alive():
             print('Failed to stop thread')
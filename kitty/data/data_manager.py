@@ -257,6 +257,19 @@ class DataManager(Thread):
         else:
             self._volatile_data[key] = data
 
+    @synced
+    def set_many(self, items):
+        '''
+        set several keys of arbitrary data in volatile memory, in a single task
+
+        :param items: dictionary of key -> data to be stored
+        '''
+        for key, data in items.items():
+            if isinstance(data, dict):
+                self._volatile_data[key] = {k: v for (k, v) in data.items()}
+            else:
+                self._volatile_data[key] = data
+
     @synced
     def get(self, key):
         '''
@@ -528,6 +541,7 @@ class SessionInfo(object):
     '''
 
     fields = [i[0] for i in SessionInfoTable.__TABLE_FIELDS__]
+    __slots__ = tuple(fields)
 
     def __init__(self, orig=None):
         '''
@@ -24,12 +24,11 @@ and will probably be changed in the future.
 '''
 import sys
 import time
+import signal
+import logging
 import traceback
-import shlex
 from binascii import hexlify
 from threading import Event
-import docopt
-from pkg_resources import get_distribution
 from kitty.core import KittyException, KittyObject
 from kitty.data.data_manager import DataManager, SessionInfo
 from kitty.data.report import Report
@@ -51,21 +50,71 @@ def _flatten_dict_entry(orig_key, v):
 
 class _Configuration(object):
 
-    def __init__(self, delay_secs, store_all_reports, session_file_name, max_failures):
+    __slots__ = ('delay_secs', 'store_all_reports', 'session_file_name', 'max_failures', 'session_flush_interval')
+
+    def __init__(self, delay_secs, store_all_reports, session_file_name, max_failures, session_flush_interval):
         self.delay_secs = delay_secs
         self.store_all_reports = store_all_reports
         self.session_file_name = session_file_name
         self.max_failures = max_failures
+        self.session_flush_interval = session_flush_interval
+
+
+_OPTIONS_USAGE = '''
+These are the options to the kitty fuzzer object, not the options to the runner.
+
+Usage:
+    fuzzer [options] [-v ...]
+
+Options:
+    -d --delay <delay>              delay between tests in secodes, float number
+    -f --session <session-file>     session file name to use
+    -n --no-env-test                don't perform environment test before the fuzzing session
+    -r --retest <session-file>      retest failed/error tests from a session file
+    -t --test-list <test-list>      a comma delimited test list string of the form "-10,12,15-20,30-"
+    -v --verbose                    be more verbose in the log
+
+Removed options:
+    end, start - use --test-list instead
+'''
+
+# option line -> parsed options, the usage is static so each line is parsed only once
+_parsed_options = {}
+
+
+def _parse_options(option_line):
+    '''
+    :param option_line: string with the command line options to be parsed
+    :return: dictionary of the options, as returned by docopt
+    '''
+    if not option_line.strip():
+        # blank lines all parse the same, keep a single entry for them
+        option_line = ''
+    options = _parsed_options.get(option_line)
+    if options is None:
+        # docopt is imported on first use, most runs parse a single option line
+        import shlex
+        import docopt
+        options = docopt.docopt(_OPTIONS_USAGE, shlex.split(option_line))
+        _parsed_options[option_line] = options
+    return dict(options)
+
+
+_current_version = None
 
 
 def _get_current_version():
-    package_name = 'kittyfuzzer'
-    #
-    # This is weird. I know that this is the way to get the version,
-    # yet for some reason pylint complains about it.
-    #
-    current_version = get_distribution(package_name).version  # pylint: disable=maybe-no-member
-    return current_version
+    global _current_version
+    if _current_version is None:
+        # pkg_resources is slow to import, and only needed for the session version
+        from pkg_resources import get_distribution
+        package_name = 'kittyfuzzer'
+        #
+        # This is weird. I know that this is the way to get the version,
+        # yet for some reason pylint complains about it.
+        #
+        _current_version = get_distribution(package_name).version  # pylint: disable=maybe-no-member
+    return _current_version
 
 
 class BaseFuzzer(KittyObject):
@@ -90,6 +139,7 @@ class BaseFuzzer(KittyObject):
             store_all_reports=False,
             session_file_name=None,
             max_failures=None,
+            session_flush_interval=5.0,
         )
         # user interface
         self.user_interface = None
@@ -105,6 +155,12 @@ class BaseFuzzer(KittyObject):
         self._in_environment_test = True
         self._started = False
         self._test_list = None
+        self._last_session_flush = 0
+        # config.max_failures, fixed when the session starts
+        self._max_failures = None
+        # sub reports of _store_report, the report is serialized before it returns
+        self._data_model_report = Report(name='Data Model')
+        self._data_report = Report('payload')
         self._handle_options(option_line)
 
     def _next_mutation(self):
@@ -134,24 +190,7 @@ class BaseFuzzer(KittyObject):
         :param option_line: string with the command line options to be parsed.
         '''
         if option_line is not None:
-            usage = '''
-            These are the options to the kitty fuzzer object, not the options to the runner.
-
-            Usage:
-                fuzzer [options] [-v ...]
-
-            Options:
-                -d --delay <delay>              delay between tests in secodes, float number
-                -f --session <session-file>     session file name to use
-                -n --no-env-test                don't perform environment test before the fuzzing session
-                -r --retest <session-file>      retest failed/error tests from a session file
-                -t --test-list <test-list>      a comma delimited test list string of the form "-10,12,15-20,30-"
-                -v --verbose                    be more verbose in the log
-
-            Removed options:
-                end, start - use --test-list instead
-            '''
-            options = docopt.docopt(usage, shlex.split(option_line))
+            options = _parse_options(option_line)
 
             # ranges
             if options['--retest']:
@@ -265,6 +304,16 @@ class BaseFuzzer(KittyObject):
             self.target.set_fuzzer(self)
         return self
 
+    def set_session_flush_interval(self, interval_secs):
+        '''
+        Set how often the session info is stored during the fuzzing session.
+        It is always stored when a failure is detected and when the session ends.
+
+        :param interval_secs: minimal interval between two stores (in seconds), 0 to store after each test
+        '''
+        self.config.session_flush_interval = interval_secs
+        return self
+
     def set_max_failures(self, max_failures):
         '''
         :param max_failures: maximum failures before stopping the fuzzing session
@@ -315,13 +364,16 @@ class BaseFuzzer(KittyObject):
         self.user_interface = interface
         return self
 
-    def _check_session_validity(self):
+    def _check_session_validity(self, model_hash):
+        '''
+        :param model_hash: hash of the current data model
+        :raise: KittyException if the stored session does not match the current kitty version or data model
+        '''
         current_version = _get_current_version()
         if current_version != self.session_info.kitty_version:
             raise KittyException('kitty version in stored session (%s) != current kitty version (%s)' % (
                 current_version,
                 self.session_info.kitty_version))
-        model_hash = self.model.hash()
         if model_hash != self.session_info.data_model_hash:
             raise KittyException('data model hash in stored session(%s) != current data model hash (%s)' % (
                 model_hash,
@@ -342,8 +394,10 @@ class BaseFuzzer(KittyObject):
         assert(self.user_interface)
         assert(self.target)
 
+        # hashing walks the whole data model, do it only once
+        model_hash = self.model.hash()
         if self._load_session():
-            self._check_session_validity()
+            self._check_session_validity(model_hash)
             self._set_test_ranges(
                 self.session_info.start_index,
                 self.session_info.end_index,
@@ -352,7 +406,7 @@ class BaseFuzzer(KittyObject):
         else:
             self.session_info.kitty_version = _get_current_version()
             # TODO: write hash for high level
-            self.session_info.data_model_hash = self.model.hash()
+            self.session_info.data_model_hash = model_hash
         # if self.session_info.end_index is None:
         #     self.session_info.end_index = self.model.last_index()
         if self._test_list is None:
@@ -367,6 +421,7 @@ class BaseFuzzer(KittyObject):
         self._store_session()
         self._test_list.skip(self.session_info.current_index)
         self.session_info.test_list_str = self._test_list.as_test_list_str()
+        self._max_failures = self.config.max_failures
 
         self._set_signal_handler()
         self.user_interface.set_data_provider(self.dataman)
@@ -416,10 +471,10 @@ class BaseFuzzer(KittyObject):
         self.not_implemented('_start')
 
     def _update_test_info(self):
-        test_info = self.model.get_test_info()
-        self.dataman.set('test_info', test_info)
-        template_info = self.model.get_template_info()
-        self.dataman.set('template_info', template_info)
+        self.dataman.set_many({
+            'test_info': self.model.get_test_info(),
+            'template_info': self.model.get_template_info(),
+        })
 
     def _pre_test(self):
         self._update_test_info()
@@ -431,24 +486,26 @@ class BaseFuzzer(KittyObject):
         :return: True if test failed
         '''
         failure_detected = False
+        config = self.config
         self.target.post_test(self.model.current_index())
         report = self._get_report()
         status = report.get_status()
         if self._in_environment_test:
             return status != Report.PASSED
         if status != Report.PASSED:
-            self._store_report(report)
+            self._store_report(report, failure=True)
             self.user_interface.failure_detected()
             failure_detected = True
             self.logger.warning('!! Failure detected !!')
-        elif self.config.store_all_reports:
-            self._store_report(report)
+        elif config.store_all_reports:
+            self._store_report(report, failure=False)
         if failure_detected:
             self.session_info.failure_count += 1
-        self._store_session()
-        if self.config.delay_secs:
-            self.logger.debug('delaying for %f seconds', self.config.delay_secs)
-            time.sleep(self.config.delay_secs)
+        self._store_session(force=failure_detected)
+        delay_secs = config.delay_secs
+        if delay_secs:
+            self.logger.debug('delaying for %f seconds', delay_secs)
+            time.sleep(delay_secs)
         return failure_detected
 
     def _get_report(self):
@@ -456,6 +513,8 @@ class BaseFuzzer(KittyObject):
         return report
 
     def _start_message(self):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         self.logger.info(
             '''
                  --------------------------------------------------
@@ -476,6 +535,8 @@ class BaseFuzzer(KittyObject):
         )
 
     def _end_message(self):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         tested = self._test_list.get_progress()
         self.logger.info(
             '''
@@ -494,23 +555,27 @@ class BaseFuzzer(KittyObject):
         )
 
     def _test_info(self):
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info('Current test: %s' % self.model.current_index())
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         fuzz_node_info = self.model.get_test_info()
-        self.logger.info('Current test: %s' % self.model.current_index())
         self.logger.debug('----------------------------------------------')
-        keys = sorted(fuzz_node_info.keys())
-        keys = [k for k in keys if k.startswith('node/field')]
-        keys = [k for k in keys if not isinstance(fuzz_node_info[k], bool)]
-        key_max_len = 0
-        for key in keys:
-            if len(key) > key_max_len:
-                key_max_len = len(str(key))
+        keys = [
+            str(k) for k in sorted(fuzz_node_info.keys())
+            if k.startswith('node/field') and not isinstance(fuzz_node_info[k], bool)
+        ]
+        # key, colon and at least one space of padding
+        key_width = max([len(k) for k in keys] or [0]) + 2
         for k in keys:
-            v = str(fuzz_node_info[k])
-            k = str(k)
-            pad = ' ' * (key_max_len - len(k) + 1)
+            v = fuzz_node_info[k]
+            if isinstance(v, (bytes, bytearray)):
+                # don't build the repr of the whole payload only to cut it
+                v = v[:71]
+            v = str(v)
             if len(v) > 70:
                 v = v[:70] + '...'
-            self.logger.debug('%s:%s%s' % (k, pad, v))
+            self.logger.debug('%s%s' % ((k + ':').ljust(key_width), v))
         self.logger.debug('----------------------------------------------')
 
     def _check_pause(self):
@@ -528,15 +593,24 @@ class BaseFuzzer(KittyObject):
         assert(self.target)
         self.user_interface.stop()
         self.target.teardown()
+        if self.dataman.is_alive():
+            self._store_session()
         self.dataman.submit_task(None)
         self._un_set_signal_handler()
 
-    def _store_report(self, report):
+    def _store_report(self, report, failure=True):
+        '''
+        :param report: the report to store
+        :param failure: is the report of a failed test, the payload's hex dump
+            is added only to reports of failed tests (default: True)
+        '''
         self.logger.debug('<in>')
-        report.add('test_number', self.model.current_index())
+        test_number = self.model.current_index()
+        report.add('test_number', test_number)
         report.add('fuzz_path', self.model.get_sequence_str())
         test_info = self.model.get_test_info()
-        data_model_report = Report(name='Data Model')
+        data_model_report = self._data_model_report
+        data_model_report.clear()
         for k, v in test_info.items():
             new_entries = _flatten_dict_entry(k, v)
             for (k_, v_) in new_entries:
@@ -544,19 +618,27 @@ class BaseFuzzer(KittyObject):
         report.add(data_model_report.get_name(), data_model_report)
         payload = self._last_payload
         if payload is not None:
-            data_report = Report('payload')
+            data_report = self._data_report
+            data_report.clear()
             data_report.add('raw', payload)
-            data_report.add('hex', hexlify(payload).decode())
+            if failure:
+                data_report.add('hex', hexlify(payload).decode())
             data_report.add('length', len(payload))
             report.add('payload', data_report)
         else:
             report.add('payload', None)
 
-        self.dataman.store_report(report, self.model.current_index())
-        self.dataman.get_report_by_id(self.model.current_index())
+        self.dataman.store_report(report, test_number)
+        self.dataman.get_report_by_id(test_number)
 
-    def _store_session(self):
-        self._set_session_info()
+    def _store_session(self, force=True):
+        '''
+        :param force: store the session info even if the flush interval did not pass yet (default: True)
+        '''
+        now = time.time()
+        if force or now - self._last_session_flush >= self.config.session_flush_interval:
+            self._set_session_info()
+            self._last_session_flush = now
 
     def _get_session_info(self):
         info = self.dataman.get_session_info()
@@ -568,8 +650,10 @@ class BaseFuzzer(KittyObject):
 
     def _set_session_info(self):
         self.dataman.set_session_info(self.session_info)
-        self.dataman.set('fuzzer_name', self.get_name())
-        self.dataman.set('session_file_name', self.config.session_file_name)
+        self.dataman.set_many({
+            'fuzzer_name': self.get_name(),
+            'session_file_name': self.config.session_file_name,
+        })
 
     def _load_session(self):
         if not self.config.session_file_name:
@@ -596,16 +680,15 @@ class BaseFuzzer(KittyObject):
         '''
         Should we still fuzz??
         '''
-        if self.config.max_failures:
-            if self.session_info.failure_count >= self.config.max_failures:
-                return False
+        max_failures = self._max_failures
+        if max_failures and self.session_info.failure_count >= max_failures:
+            return False
         return self._test_list.current() is not None
 
     def _set_signal_handler(self):
         '''
         Replace the signal handler with self._exit_now
         '''
-        import signal
         signal.signal(signal.SIGINT, self._exit_now)
 
     @classmethod
@@ -613,5 +696,4 @@ class BaseFuzzer(KittyObject):
         '''
         Set the default signal handler
         '''
-        import signal
         signal.signal(signal.SIGINT, signal.SIG_DFL)
@@ -48,9 +48,8 @@ class ClientFuzzer(BaseFuzzer):
         '''
         super(ClientFuzzer, self).__init__(name, logger, option_line)
         self._target_control_thread = LoopFuncThread(self._do_trigger)
-        self._trigger_stop_evt = Event()
-        self._target_control_thread.set_func_stop_event(self._trigger_stop_evt)
         self._index_in_path = 0
+        self._fuzz_path_names = []
         self._requested_stages = []
         self._report = None
         self._done_evt = Event()
@@ -88,15 +87,19 @@ class ClientFuzzer(BaseFuzzer):
         self._check_pause()
         if self._next_mutation():
             self._fuzz_path = self.model.get_sequence()
+            # lowercase node names once per test, stages are matched against them case-insensitively
+            self._fuzz_path_names = [edge.dst.name.lower() for edge in self._fuzz_path]
             self._index_in_path = 0
             self._pre_test()
             self._test_info()
             self.target.trigger()
             self._post_test()
         else:
+            self._store_session()
             self._end_message()
             self._done_evt.set()
-            self._trigger_stop_evt.wait()
+            # nothing left to trigger, let the control thread end
+            return LoopFuncThread.STOP
 
     def _start(self):
         self._target_control_thread.start()
@@ -107,25 +110,28 @@ class ClientFuzzer(BaseFuzzer):
         '''
         pass
 
-    def _should_fuzz_node(self, fuzz_node, stage):
+    def _should_fuzz_node(self, stage):
         '''
         The matching stage is either the name of the last node, or ClientFuzzer.STAGE_ANY.
 
+        :param stage: current stage of the stack, in lower case
         :return: True if we are in the correct model node
         '''
         if stage == ClientFuzzer.STAGE_ANY:
             return True
-        if fuzz_node.name.lower() == stage.lower():
+        if self._fuzz_path_names[self._index_in_path] == stage:
             if self._index_in_path == len(self._fuzz_path) - 1:
                 return True
         else:
             return False
 
     def _update_path_index(self, stage):
+        '''
+        :param stage: current stage of the stack, in lower case
+        '''
         last_index_in_path = len(self._fuzz_path) - 1
         if self._index_in_path < last_index_in_path:
-            node = self._fuzz_path[self._index_in_path].dst
-            if node.name.lower() == stage.lower():
+            if self._fuzz_path_names[self._index_in_path] == stage:
                 self._index_in_path += 1
 
     def get_mutation(self, stage, data):
@@ -141,13 +147,15 @@ class ClientFuzzer(BaseFuzzer):
         # payload - while inside the same test
         # if self._keep_running() and self._do_fuzz.is_set():
         if self._keep_running():
-            fuzz_node = self._fuzz_path[self._index_in_path].dst
-            if self._should_fuzz_node(fuzz_node, stage):
+            # STAGE_ANY has no letters, so it is not changed by lower()
+            stage_lower = stage.lower()
+            if self._should_fuzz_node(stage_lower):
+                fuzz_node = self._fuzz_path[self._index_in_path].dst
                 fuzz_node.set_session_data(data)
                 payload = fuzz_node.render().tobytes()
                 self._last_payload = payload
             else:
-                self._update_path_index(stage)
+                self._update_path_index(stage_lower)
         if payload:
             self._notify_mutated()
         self._requested_stages.append((stage, payload))
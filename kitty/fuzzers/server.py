@@ -45,6 +45,7 @@ class ServerFuzzer(BaseFuzzer):
                 self.logger.error('Error occurred while fuzzing: %s', repr(e))
                 self.logger.error(traceback.format_exc())
                 break
+        self._store_session()
         self._end_message()
 
     def _test_environment(self):
@@ -17,10 +17,23 @@
 '''
 Managers for the test list used by the fuzzer
 '''
-import re
 from kitty.core import KittyException
 
 
+def _parse_index(num_str):
+    '''
+    :param num_str: string to parse
+    :return: the number in num_str, None if it is not a plain decimal number
+    '''
+    if num_str.isdigit():
+        try:
+            return int(num_str)
+        except ValueError:
+            # digits that int() does not accept, such as superscripts
+            pass
+    return None
+
+
 class StartEndList(object):
 
     def __init__(self, start, end):
@@ -90,40 +103,34 @@ class RangesList(object):
             self._lists = [StartEndList(0, None)]
         else:
             lists = []
-            p_single = re.compile(r'(\d+)$')
-            p_open_left = re.compile(r'-(\d+)$')
-            p_open_right = re.compile(r'(\d+)-$')
-            p_closed = re.compile(r'(\d+)-(\d+)$')
             for entry in self._ranges_str.split(','):
                 entry = entry.strip()
 
+                left, dash, right = entry.partition('-')
+                start = _parse_index(left)
+                end = _parse_index(right)
+
                 # single number
-                match = p_single.match(entry)
-                if match:
-                    num = int(match.groups()[0])
-                    lists.append(StartEndList(num, num + 1))
-                    continue
+                if not dash:
+                    if start is not None:
+                        lists.append(StartEndList(start, start + 1))
+                        continue
 
                 # open left
-                match = p_open_left.match(entry)
-                if match:
-                    end = int(match.groups()[0])
-                    lists.append(StartEndList(0, end + 1))
-                    continue
+                elif not left:
+                    if end is not None:
+                        lists.append(StartEndList(0, end + 1))
+                        continue
 
                 # open right
-                match = p_open_right.match(entry)
-                if match:
-                    start = int(match.groups()[0])
-                    self._open_end_start = start
-                    lists.append(StartEndList(start, None))
-                    continue
+                elif not right:
+                    if start is not None:
+                        self._open_end_start = start
+                        lists.append(StartEndList(start, None))
+                        continue
 
                 # closed range
-                match = p_closed.match(entry)
-                if match:
-                    start = int(match.groups()[0])
-                    end = int(match.groups()[1])
+                elif start is not None and end is not None:
                     lists.append(StartEndList(start, end + 1))
                     continue
 
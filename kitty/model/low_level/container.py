@@ -603,6 +603,8 @@ class Pad(Container):
         super(Pad, self).__init__(fields=fields, encoder=ENC_BITS_DEFAULT, fuzzable=fuzzable, name=name)
         self._pad_length = pad_length
         self._pad_data = Bits(bytes=strToBytes(pad_data))
+        # pad_data repeated up to pad_length, built on first use
+        self._padding = None
 
     def render(self, ctx=None):
         '''
@@ -617,8 +619,10 @@ class Pad(Container):
     def _pad_buffer(self, prepad):
         to_pad = self._pad_length - len(prepad)
         if to_pad > 0:
-            padding_data = self._pad_data * (to_pad // len(self._pad_data) + 1)
-            return prepad + padding_data[:to_pad]
+            if self._padding is None:
+                padding = self._pad_data * (self._pad_length // len(self._pad_data) + 1)
+                self._padding = padding[:self._pad_length]
+            return prepad + self._padding[:to_pad]
         return prepad
 
     def _initialize_default_buffer(self):
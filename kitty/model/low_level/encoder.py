@@ -38,10 +38,61 @@ import sys
 import six
 from struct import pack
 from binascii import hexlify
-from base64 import b64encode
-from bitstring import Bits, BitArray
+try:
+    # same output as base64.b64encode, with SIMD when the CPU supports it
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+from bitstring import Bits, BitArray, InterpretError
 from kitty.core import kassert, KittyException
 
+# int.to_bytes is not available on python 2
+_int_to_bytes = hasattr(int, 'to_bytes')
+
+try:
+    from bitstring import ByteStore as _ByteStore
+except ImportError:
+    _ByteStore = None
+
+
+def _make_bits(data, cls=Bits):
+    '''
+    Same as ``cls(bytes=data)``, without going through the generic
+    initialization of bitstring
+
+    :param data: bytes to wrap
+    :param cls: Bits or BitArray (default: Bits)
+    :rtype: Bits
+    '''
+    if _ByteStore is None:
+        return cls(bytes=data)
+    bits = object.__new__(cls)
+    bits._datastore = _ByteStore(bytearray(data), len(data) * 8, 0)
+    return bits
+
+
+def _make_bits_works():
+    '''
+    :return: True if the fast path of _make_bits builds the same objects as bitstring,
+        it relies on bitstring internals that may change between versions
+    '''
+    try:
+        for cls in (Bits, BitArray):
+            for data in (b'', b'\x00', b'\x80\x01kitty'):
+                bits = _make_bits(data, cls)
+                expected = cls(bytes=data)
+                if type(bits) is not cls or bits != expected or bits.bytes != data or len(bits) != len(expected):
+                    return False
+                if (bits + expected)[len(bits):] != expected:
+                    return False
+    except Exception:
+        return False
+    return True
+
+
+if _ByteStore is not None and not _make_bits_works():
+    _ByteStore = None
+
 
 def strToBytes(value):
     '''
@@ -49,11 +100,16 @@ def strToBytes(value):
     :param value: value to encode
     '''
     kassert.is_of_types(value, (bytes, bytearray, six.string_types))
-    if isinstance(value, six.string_types):
-        return bytes(bytearray([ord(x) for x in value]))
+    if isinstance(value, bytes):
+        return value
     elif isinstance(value, bytearray):
         return bytes(value)
-    return value
+    try:
+        # each character is a byte, latin-1 maps them one to one
+        return value.encode('latin-1')
+    except UnicodeEncodeError:
+        # raises ValueError on a character above 0xff
+        return bytes(bytearray([ord(x) for x in value]))
 
 
 def strToUtf8(value):
@@ -63,9 +119,25 @@ def strToUtf8(value):
     '''
     kassert.is_of_types(value, str)
     if sys.version_info < (3,):
-        return ''.join([unichr(ord(x)) for x in value])
+        return value.decode('latin-1')
     return value
 
+
+# bytes.isascii was added in python 3.7
+_bytes_isascii = getattr(bytes, 'isascii', None)
+
+
+def _bytes_to_utf8(value):
+    '''
+    :type value: ``bytes``
+    :param value: value to encode, each byte is a code point
+    :return: the value encoded in UTF-8
+    '''
+    if _bytes_isascii is not None and _bytes_isascii(value):
+        # ascii is encoded as is in UTF-8
+        return value
+    return value.decode('latin-1').encode('utf-8')
+
 # ################### String Encoders ####################
 
 
@@ -93,7 +165,7 @@ class StrEncoder(object):
         :type value: ``str``
         :param value: value to encode
         '''
-        return Bits(bytes=strToBytes(value))
+        return _make_bits(strToBytes(value))
 
 
 class StrFuncEncoder(StrEncoder):
@@ -110,7 +182,7 @@ class StrFuncEncoder(StrEncoder):
 
     def encode(self, value):
         encoded = self._func(strToBytes(value))
-        return Bits(bytes=encoded)
+        return _make_bits(encoded)
 
 
 _py2_str_encoder_funcs_cache = {}
@@ -137,7 +209,7 @@ class StrEncodeEncoder(StrFuncEncoder):
         elif encoding == 'base64':
             func = b64encode
         elif encoding == 'utf-8':
-            func = strToUtf8
+            func = _bytes_to_utf8
         elif encoding == 'bytes':
             func = strToBytes
         elif isinstance(encoding, str):
@@ -160,7 +232,7 @@ class StrNullTerminatedEncoder(StrEncoder):
         :param value: value to encode
         '''
         encoded = strToBytes(value) + b'\x00'
-        return Bits(bytes=encoded)
+        return _make_bits(encoded)
 
 
 ENC_STR_BASE64 = StrEncodeEncoder('base64')
@@ -212,6 +284,9 @@ class BitFieldBinEncoder(BitFieldEncoder):
     Encode int as binary
     '''
 
+    #: maximal number of encoded values that each encoder keeps for reuse
+    cache_size = 4096
+
     def __init__(self, mode):
         '''
         :type mode: str
@@ -220,6 +295,10 @@ class BitFieldBinEncoder(BitFieldEncoder):
         kassert.is_in(mode, ['', 'be', 'le'])
         super(BitFieldBinEncoder, self).__init__()
         self._mode = mode
+        # without endianess, byte aligned ints are big endian
+        self._byteorder = 'little' if mode == 'le' else 'big'
+        # (value, length, signed) -> encoded value, Bits are immutable so they can be shared
+        self._cache = {}
 
     def encode(self, value, length, signed):
         '''
@@ -227,8 +306,25 @@ class BitFieldBinEncoder(BitFieldEncoder):
         :param length: length of value in bits
         :param signed: is value signed
         '''
-        if (length % 8 != 0) and self._mode:
-            raise Exception('cannot use endianess for non bytes aligned int')
+        key = (value, length, signed)
+        encoded = self._cache.get(key)
+        if encoded is None:
+            encoded = self._encode(value, length, signed)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = encoded
+        return encoded
+
+    def _encode(self, value, length, signed):
+        if length % 8 != 0:
+            if self._mode:
+                raise Exception('cannot use endianess for non bytes aligned int')
+        elif _int_to_bytes and length and isinstance(value, int):
+            try:
+                return _make_bits(value.to_bytes(length // 8, self._byteorder, signed=signed))
+            except OverflowError:
+                # out of range, let bitstring raise its usual error
+                pass
         pre = '' if signed else 'u'
         fmt = '%sint%s:%d=%d' % (pre, self._mode, length, value)
         return Bits(fmt)
@@ -241,15 +337,28 @@ class BitFieldAsciiEncoder(BitFieldEncoder):
 
     formats = ['%d', '%x', '%X', '%#x', '%#X']
 
+    #: maximal number of encoded values that each encoder keeps for reuse
+    cache_size = 4096
+
     def __init__(self, fmt):
         '''
         :param fmt: format for encoding (from BitFieldAsciiEncoder.formats)
         '''
         kassert.is_in(fmt, BitFieldAsciiEncoder.formats)
         self._fmt = fmt
+        # formatting into bytes saves the conversion of the result
+        self._bytes_fmt = fmt.encode('ascii')
+        # value -> encoded value, the length is not part of the encoding
+        self._cache = {}
 
     def encode(self, value, length, signed):
-        return Bits(bytes=strToBytes(self._fmt % value))
+        encoded = self._cache.get(value)
+        if encoded is None:
+            encoded = _make_bits(self._bytes_fmt % value)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[value] = encoded
+        return encoded
 
 
 class BitFieldMultiByteEncoder(BitFieldEncoder):
@@ -291,8 +400,7 @@ class BitFieldMultiByteEncoder(BitFieldEncoder):
         # remove msb from last byte
         bytes_arr[-1] = bytes_arr[-1] & 0x7f
 
-        multi_bytes = ''.join(chr(x) for x in bytes_arr)
-        return Bits(bytes=strToBytes(multi_bytes))
+        return _make_bits(bytearray(bytes_arr))
 
 
 ENC_INT_BIN = BitFieldBinEncoder('')
@@ -344,6 +452,10 @@ class BitsEncoder(object):
         return value
 
 
+# remainder of the length in bits -> zero bits that make it byte aligned
+_ALIGNMENT_PADS = tuple(Bits((8 - i) % 8) for i in range(8))
+
+
 class ByteAlignedBitsEncoder(BitsEncoder):
     '''
     Stuff bits for byte alignment
@@ -356,10 +468,14 @@ class ByteAlignedBitsEncoder(BitsEncoder):
         kassert.is_of_types(value, Bits)
         remainder = len(value) % 8
         if remainder:
-            value += Bits(bin='0' * (8 - remainder))
+            value += _ALIGNMENT_PADS[remainder]
         return value
 
 
+# byte -> the same byte with its bits in reverse order
+_REVERSED_BITS_TABLE = bytes(bytearray(int('{:08b}'.format(i)[::-1], 2) for i in range(256)))
+
+
 class ReverseBitsEncoder(BitsEncoder):
     '''
     Reverse the order of bits
@@ -370,6 +486,9 @@ class ReverseBitsEncoder(BitsEncoder):
         :param value: value to encode
         '''
         kassert.is_of_types(value, Bits)
+        if len(value) % 8 == 0:
+            # reverse the bytes, and the bits inside each byte
+            return _make_bits(value.bytes.translate(_REVERSED_BITS_TABLE)[::-1], BitArray)
         result = BitArray(value)
         result.reverse()
         return result
@@ -387,15 +506,25 @@ class StrEncoderWrapper(ByteAlignedBitsEncoder):
         '''
         super(StrEncoderWrapper, self).__init__()
         self._encoder = encoder
+        # StrFuncEncoder.encode only converts its input to bytes before calling its function,
+        # value.bytes already is, so the function can be called directly
+        if six.get_unbound_function(type(encoder).encode) is six.get_unbound_function(StrFuncEncoder.encode):
+            self._func = encoder._func
+        else:
+            self._func = None
 
     def encode(self, value):
         '''
         :param value: value to encode
         '''
         kassert.is_of_types(value, Bits)
-        if len(value) % 8 != 0:
+        try:
+            data = value.bytes
+        except InterpretError:
             raise KittyException('this encoder cannot encode bits that are not byte aligned')
-        return self._encoder.encode(value.bytes)
+        if self._func is not None:
+            return _make_bits(self._func(data))
+        return self._encoder.encode(data)
 
 
 class BitsFuncEncoder(BitsEncoder):
@@ -486,7 +615,7 @@ class FloatBinEncoder(FloatEncoder):
         :param value: value to encode
         '''
         packed = pack(self.fmt, value)
-        return Bits(bytes=packed)
+        return _make_bits(packed)
 
 
 class FloatAsciiEncoder(FloatEncoder):
@@ -506,7 +635,7 @@ class FloatAsciiEncoder(FloatEncoder):
         '''
         :param value: value to encode
         '''
-        return Bits(bytes=strToBytes(self.fmt % value))
+        return _make_bits(strToBytes(self.fmt % value))
 
 
 ENC_FLT_LE = FloatBinEncoder('<f')
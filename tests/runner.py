@@ -16,10 +16,13 @@
 # along with Kitty.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import unittest
+from test_core_threading_utils import *
+from test_data_manager import *
 from test_data_report import *
 from test_fuzzer_client import *
 from test_fuzzer_server import *
 from test_interface_web import *
+from test_kitty_tool import *
 from test_model_high_level import *
 from test_model_low_level_calculated import *
 from test_model_low_level_condition import *
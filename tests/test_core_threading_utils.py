@@ -0,0 +1,75 @@
+# Copyright (C) 2016 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+#
+# This file is part of Kitty.
+#
+# Kitty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Kitty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Kitty.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Tests for the threading utils
+'''
+import time
+import threading
+import unittest
+from kitty.core.threading_utils import LoopFuncThread
+
+
+class LoopFuncThreadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.thread = None
+
+    def tearDown(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.stop()
+
+    def _stop_after(self, count, *args):
+        self.calls.append(args)
+        if len(self.calls) >= count:
+            return LoopFuncThread.STOP
+
+    def testFuncReturningStopEndsLoop(self):
+        self.thread = LoopFuncThread(self._stop_after, 3, 'arg')
+        self.thread.start()
+        self.thread.join(timeout=5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(self.calls, [('arg',)] * 3)
+
+    def testOtherReturnValuesKeepLooping(self):
+        results = [None, False, 0, '', object()]
+
+        def func():
+            self.calls.append(None)
+            if results:
+                return results.pop(0)
+            return LoopFuncThread.STOP
+        self.thread = LoopFuncThread(func)
+        self.thread.start()
+        self.thread.join(timeout=5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(len(self.calls), 6)
+
+    def testStopEndsLoop(self):
+        func_stop_event = threading.Event()
+
+        def func():
+            self.calls.append(None)
+            func_stop_event.wait(0.01)
+        self.thread = LoopFuncThread(func)
+        self.thread.set_func_stop_event(func_stop_event)
+        self.thread.start()
+        while not self.calls:
+            time.sleep(0.01)
+        self.thread.stop()
+        self.assertFalse(self.thread.is_alive())
+        self.assertTrue(func_stop_event.is_set())
@@ -0,0 +1,92 @@
+# Copyright (C) 2016 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+#
+# This file is part of Kitty.
+#
+# Kitty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Kitty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Kitty.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Tests for the data manager
+'''
+import unittest
+from kitty.data.data_manager import DataManager
+
+
+class DataManagerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dataman = DataManager(':memory:')
+        self.dataman.start()
+        self.submitted = []
+        submit_task = self.dataman.submit_task
+
+        def counting_submit_task(task):
+            self.submitted.append(task)
+            return submit_task(task)
+        self.dataman.submit_task = counting_submit_task
+
+    def tearDown(self):
+        self.dataman.stop()
+
+    def testGetMissingKey(self):
+        self.assertIsNone(self.dataman.get('missing'))
+
+    def testSet(self):
+        self.dataman.set('key', 'value')
+        self.assertEqual(self.dataman.get('key'), 'value')
+
+    def testSetOverrides(self):
+        self.dataman.set('key', 'value')
+        self.dataman.set('key', 'other')
+        self.assertEqual(self.dataman.get('key'), 'other')
+
+    def testSetCopiesDict(self):
+        data = {'a': 1}
+        self.dataman.set('key', data)
+        data['a'] = 2
+        self.assertEqual(self.dataman.get('key'), {'a': 1})
+
+    def testSetMany(self):
+        self.dataman.set_many({'key1': 'value1', 'key2': [1, 2], 'key3': None})
+        self.assertEqual(self.dataman.get('key1'), 'value1')
+        self.assertEqual(self.dataman.get('key2'), [1, 2])
+        self.assertIsNone(self.dataman.get('key3'))
+
+    def testSetManyIsSingleTask(self):
+        self.dataman.set_many({'key1': 'value1', 'key2': 'value2', 'key3': 'value3'})
+        self.assertEqual(len(self.submitted), 1)
+
+    def testSetManyEmpty(self):
+        self.dataman.set('key', 'value')
+        self.dataman.set_many({})
+        self.assertEqual(self.dataman.get('key'), 'value')
+
+    def testSetManyOverrides(self):
+        self.dataman.set_many({'key1': 'value1', 'key2': 'value2'})
+        self.dataman.set_many({'key2': 'other'})
+        self.assertEqual(self.dataman.get('key1'), 'value1')
+        self.assertEqual(self.dataman.get('key2'), 'other')
+
+    def testSetManyCopiesDict(self):
+        data = {'a': 1}
+        self.dataman.set_many({'key': data})
+        data['a'] = 2
+        self.assertEqual(self.dataman.get('key'), {'a': 1})
+
+    def testSetManySameAsSet(self):
+        items = {'key1': 'value1', 'key2': {'a': 1}}
+        for key, data in items.items():
+            self.dataman.set(key, data)
+        expected = dict((key, self.dataman.get(key)) for key in items)
+        self.dataman.set_many(dict((key, 'other') for key in items))
+        self.dataman.set_many(items)
+        self.assertEqual(dict((key, self.dataman.get(key)) for key in items), expected)
@@ -42,6 +42,21 @@ def get_test_logger():
     return test_logger
 
 
+class InterruptingServerTargetMock(ServerTargetMock):
+    '''
+    Raise KeyboardInterrupt in the middle of the session, like a user hitting Ctrl-C
+    '''
+
+    def __init__(self, interrupt_at, config=None, logger=None):
+        super(InterruptingServerTargetMock, self).__init__(config, logger)
+        self.interrupt_at = interrupt_at
+
+    def pre_test(self, test_num):
+        super(InterruptingServerTargetMock, self).pre_test(test_num)
+        if test_num == self.interrupt_at:
+            raise KeyboardInterrupt()
+
+
 class TestServerFuzzer(unittest.TestCase):
 
     def setUp(self):
@@ -154,6 +169,14 @@ class TestServerFuzzer(unittest.TestCase):
         pre_test_list = self.target.instrument.list_get('pre_test')
         self.assertListEqual(pre_test_list, [1, 3, 5, 7])
 
+    def testEmptyCommandLineMatchesDocopt(self):
+        import docopt
+        from kitty.fuzzers.base import _OPTIONS_USAGE, _parse_options
+        expected = docopt.docopt(_OPTIONS_USAGE, [])
+        self.assertEqual(_parse_options(''), expected)
+        self.assertEqual(_parse_options('  '), expected)
+        self.fuzzer = None
+
     def testMaxFailures(self):
         target_config = {
             '1': {'send': {"raise exception": True}},
@@ -208,6 +231,72 @@ class TestServerFuzzer(unittest.TestCase):
 
         os.remove(session_file_name)
 
+    def _record_session_flushes(self, fuzzer):
+        flushes = []
+        set_session_info = fuzzer._set_session_info
+
+        def recording_set_session_info():
+            flushes.append((fuzzer.session_info.current_index, fuzzer.session_info.failure_count))
+            set_session_info()
+        fuzzer._set_session_info = recording_set_session_info
+        return flushes
+
+    def _new_flush_fuzzer(self, cmd_line, flush_interval):
+        self.fuzzer = ServerFuzzer(name='TestServerFuzzer', logger=self.logger, option_line=cmd_line)
+        self.fuzzer.set_interface(self.interface)
+        self.fuzzer.set_model(self.new_model())
+        self.fuzzer.set_target(self.target)
+        self.fuzzer.set_session_flush_interval(flush_interval)
+        return self._record_session_flushes(self.fuzzer)
+
+    def testSessionFlushCoalesced(self):
+        flushes = self._new_flush_fuzzer('--test-list=0-10 --no-env-test', 0)
+        self.fuzzer.start()
+        flushes_per_test = len(flushes)
+        self.fuzzer.stop()
+
+        self.target = ServerTargetMock({}, logger=self.logger)
+        flushes = self._new_flush_fuzzer('--test-list=0-10 --no-env-test', 1000)
+        self.fuzzer.start()
+        self.assertListEqual(self.target.instrument.list_get('pre_test'), list(range(11)))
+        self.assertEqual(len(flushes), flushes_per_test - 11)
+        # the last flush holds the final state of the session
+        self.assertEqual(flushes[-1][0], self.fuzzer.session_info.current_index)
+        self.assertEqual(self.fuzzer._get_session_info().current_index, self.fuzzer.session_info.current_index)
+
+    def testSessionFlushOnFailure(self):
+        target_config = {
+            '3': {'send': {"raise exception": True}},
+            '7': {'send': {"raise exception": True}},
+        }
+        self.target = ServerTargetMock(target_config, logger=self.logger)
+        flushes = self._new_flush_fuzzer('--test-list=0-10 --no-env-test', 1000)
+        self.fuzzer.start()
+        # stored when loaded, when started, after each failure and at the end
+        self.assertListEqual([failure_count for _, failure_count in flushes], [0, 0, 1, 2, 2])
+
+    def testSessionFlushOnStopResumes(self):
+        self.session_file_name = 'testSessionFlushOnStopResumes.session'
+        if os.path.exists(self.session_file_name):
+            os.remove(self.session_file_name)
+        cmd_line = '--test-list=0-10 --no-env-test --session=%s' % (self.session_file_name)
+
+        self.logger.info('Interrupt the fuzzer in the middle of the session, before the interval passes')
+        self.target = InterruptingServerTargetMock(4, {}, logger=self.logger)
+        flushes = self._new_flush_fuzzer(cmd_line, 1000)
+        self.assertRaises(KeyboardInterrupt, self.fuzzer.start)
+        current_index = self.fuzzer.session_info.current_index
+        self.assertNotIn(current_index, [index for index, _ in flushes])
+        self.fuzzer.stop()
+        self.fuzzer = None
+        self.assertEqual(flushes[-1][0], current_index)
+
+        self.logger.info('Resume the session')
+        self.target = ServerTargetMock({}, logger=self.logger)
+        self._new_flush_fuzzer(cmd_line, 1000)
+        self.fuzzer.start()
+        self.assertListEqual(self.target.instrument.list_get('pre_test'), list(range(current_index, 11)))
+
     def testRetest(self):
         session_file_name = 'testSessionResume.session'
         try:
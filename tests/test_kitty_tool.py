@@ -0,0 +1,224 @@
+# Copyright (C) 2016 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+#
+# This file is part of Kitty.
+#
+# Kitty is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Kitty is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Kitty.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Tests for kitty-tool
+'''
+import os
+import json
+import shutil
+import tarfile
+import logging
+import tempfile
+import unittest
+from base64 import b64decode
+import docopt
+from kitty.bin import kitty_tool
+from kitty.bin.kitty_tool import compile_filename_format, FileGeneratorHandler, FileIterator
+
+
+TEMPLATES = '''
+from kitty.model import Template, String, UInt8
+
+tmpl = Template(name='tmpl', fields=[
+    String(u'caf\\xe9', name='str'),
+    UInt8(1, name='num'),
+])
+'''
+
+
+def parse_args(argv):
+    return docopt.docopt(kitty_tool.__doc__, argv=argv)
+
+
+class FilenameFormatTests(unittest.TestCase):
+
+    def _handler(self, fmt):
+        opts = parse_args(['generate', '-f', fmt, 'templates.py', 'tmpl'])
+        return FileGeneratorHandler(opts, None)
+
+    def _testFormat(self, fmt, expected):
+        self._handler(fmt)
+        self.assertEqual(compile_filename_format(fmt, 'tmpl')(7), expected)
+        self.assertEqual(compile_filename_format(fmt, 'tmpl')(7), fmt % {'template': 'tmpl', 'index': 7})
+
+    def testDefaultFormat(self):
+        self._testFormat('%(template)s.%(index)s.bin', 'tmpl.7.bin')
+
+    def testIndexDecimal(self):
+        self._testFormat('%(index)d', '7')
+
+    def testIndexZeroPadded(self):
+        self._testFormat('%(index)05d', '00007')
+
+    def testIndexLengthModifier(self):
+        self._testFormat('%(index)ld', '7')
+
+    def testTemplateOnly(self):
+        self._testFormat('%(template)s', 'tmpl')
+
+    def testIndexTwice(self):
+        self._testFormat('%(index)d-%(index)x', '7-7')
+
+    def testEscapedPercent(self):
+        self._testFormat('%%(index)d.%(index)d', '%(index)d.7')
+
+    def testTemplateWithPercent(self):
+        self.assertEqual(compile_filename_format('%(template)s.%(index)d', 'a%b')(7), 'a%b.7')
+
+    def testBadKey(self):
+        with self.assertRaises(Exception):
+            self._handler('%(template)s.%(idx)d')
+
+    def testBadConversion(self):
+        with self.assertRaises(Exception):
+            self._handler('%(template)d.%(index)d')
+
+
+class DumpMetadataTests(unittest.TestCase):
+
+    def setUp(self):
+        self.orjson = kitty_tool.orjson
+
+    def tearDown(self):
+        kitty_tool.orjson = self.orjson
+
+    def testSameOutputWithoutOrjson(self):
+        if self.orjson is None:
+            self.skipTest('orjson is not installed')
+        info = {
+            'name': u'caf\xe9',
+            'field': {'path': 'a/b', 'value': {'raw': "'\\x00'", 'length': 3}},
+            'list': [1, 2, {}],
+            'empty': [],
+        }
+        with_orjson = kitty_tool.dump_metadata(info)
+        kitty_tool.orjson = None
+        self.assertEqual(kitty_tool.dump_metadata(info), with_orjson)
+
+    def testNonAsciiIsUtf8(self):
+        kitty_tool.orjson = None
+        self.assertEqual(kitty_tool.dump_metadata({'name': u'caf\xe9'}), u'{\n  "name": "caf\xe9"\n}'.encode('utf-8'))
+
+
+class GeneratorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.workdir, 'templates.py')
+        with open(self.template_file, 'w') as f:
+            f.write(TEMPLATES)
+        self.logger = logging.getLogger('kitty-tool-test')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _generate(self, *args):
+        out = os.path.join(self.workdir, 'out%d' % len(os.listdir(self.workdir)))
+        opts = parse_args(['generate', '-o', out, '-c', '40'] + list(args) + [self.template_file, 'tmpl'])
+        handler = FileGeneratorHandler(opts, self.logger)
+        FileIterator(self.template_file, handler, self.logger).iterate()
+        return out
+
+    def _read_dir(self, path):
+        files = {}
+        for name in os.listdir(path):
+            with open(os.path.join(path, name), 'rb') as f:
+                files[name] = f.read()
+        return files
+
+    def testParallelSameAsSerial(self):
+        serial = self._read_dir(self._generate())
+        parallel = self._read_dir(self._generate('--jobs', '2'))
+        self.assertEqual(len(serial), 80)
+        self.assertEqual(sorted(parallel.keys()), sorted(serial.keys()))
+        for name in serial:
+            self.assertEqual(parallel[name], serial[name], name)
+
+    def testCombinedMetadataRoundTrip(self):
+        separate = self._read_dir(self._generate())
+        combined_dir = self._generate('--combined-metadata')
+        combined = self._read_dir(combined_dir)
+        self.assertEqual(sorted(combined.keys()), sorted(name for name in separate if not name.endswith('.metadata')))
+        for name in combined:
+            payload, metadata = kitty_tool.read_combined_file(os.path.join(combined_dir, name))
+            self.assertEqual(payload, separate[name])
+            self.assertEqual(b64decode(metadata['value']['rendered']['base64']), payload)
+            self.assertEqual(metadata, json.loads(separate[name + '.metadata'].decode('utf-8')))
+            self.assertEqual(metadata['mutation']['current_index'], int(name.split('.')[1]))
+
+    def _read_archive(self, path):
+        files = {}
+        with tarfile.open(path) as tar:
+            for member in tar.getmembers():
+                files[member.name] = tar.extractfile(member).read()
+        return files
+
+    def _testArchive(self, *args):
+        expected = self._read_dir(self._generate())
+        archive = os.path.join(self.workdir, 'out.tar')
+        self._generate('--archive', archive, *args)
+        self.assertEqual(self._read_archive(archive), expected)
+
+    def testArchive(self):
+        self._testArchive()
+
+    def testArchiveParallel(self):
+        self._testArchive('--jobs', '2')
+
+    def testArchiveParallelSmallBatches(self):
+        archive_chunk_size = kitty_tool._ARCHIVE_CHUNK_SIZE
+        kitty_tool._ARCHIVE_CHUNK_SIZE = 3
+        try:
+            self._testArchive('--jobs', '2')
+        finally:
+            kitty_tool._ARCHIVE_CHUNK_SIZE = archive_chunk_size
+
+
+class DirectoryWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.writev = kitty_tool._writev
+
+    def tearDown(self):
+        kitty_tool._writev = self.writev
+        shutil.rmtree(self.outdir)
+
+    def _testWrite(self, data):
+        writer = kitty_tool.DirectoryWriter(self.outdir)
+        writer.submit('file', data)
+        writer.close()
+        with open(os.path.join(self.outdir, 'file'), 'rb') as f:
+            content = f.read()
+        self.assertEqual(content, b''.join(data) if isinstance(data, list) else data)
+
+    def testBytes(self):
+        self._testWrite(b'payload')
+
+    def testChunks(self):
+        self._testWrite([b'\x00\x00\x00\x07', b'payload', b'', b'metadata'])
+
+    def testChunksWithoutWritev(self):
+        kitty_tool._writev = None
+        self._testWrite([b'\x00\x00\x00\x07', b'payload', b'', b'metadata'])
+
+    def testChunksShortWritev(self):
+        def short_writev(fd, chunks):
+            # write only part of the second chunk
+            return os.write(fd, chunks[0] + chunks[1][:3])
+        kitty_tool._writev = short_writev
+        self._testWrite([b'\x00\x00\x00\x07', b'payload', b'', b'metadata'])
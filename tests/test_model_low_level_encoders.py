@@ -20,14 +20,15 @@ Tests for low level encoders:
 '''
 from struct import pack
 from binascii import hexlify
-from bitstring import Bits
+from bitstring import Bits, BitArray
 from kitty.model.low_level.encoder import BitFieldMultiByteEncoder
 from kitty.model.low_level.encoder import StrFuncEncoder, StrEncodeEncoder
 from kitty.model.low_level.encoder import StrNullTerminatedEncoder
 from kitty.model.low_level.encoder import BitsEncoder, ByteAlignedBitsEncoder, ReverseBitsEncoder
 from kitty.model.low_level.encoder import StrEncoderWrapper, BitsFuncEncoder
-from kitty.model.low_level.encoder import BitFieldBinEncoder
-from kitty.model.low_level.encoder import strToBytes
+from kitty.model.low_level.encoder import BitFieldBinEncoder, BitFieldAsciiEncoder
+from kitty.model.low_level.encoder import strToBytes, ENC_BITS_UTF8
+from kitty.model.low_level import encoder
 from kitty.model.low_level import BitField
 from kitty.core import KittyException
 from common import BaseTestCase
@@ -72,6 +73,14 @@ class BitFieldBinEncoderTests(BaseTestCase):
         with self.assertRaises(Exception):
             uut.encode(1, 9, True)
 
+    def testCachedValues(self):
+        uut = self.get_default_encoder()
+        uut.cache_size = 10
+        for value in range(25):
+            self.assertEqual(uut.encode(value, self.length, self.signed), self._encode_func(value))
+            self.assertEqual(uut.encode(value, self.length, self.signed), self._encode_func(value))
+        self.assertLessEqual(len(uut._cache), uut.cache_size)
+
 
 class BitFieldMultiByteEncoderTest(BaseTestCase):
 
@@ -152,6 +161,26 @@ class BitFieldMultiByteEncoderTest(BaseTestCase):
             )
 
 
+class BitFieldAsciiEncoderTest(BaseTestCase):
+
+    def setUp(self, cls=BitFieldAsciiEncoder):
+        super(BitFieldAsciiEncoderTest, self).setUp(cls)
+
+    def testCorrectEncoding(self):
+        for fmt in BitFieldAsciiEncoder.formats:
+            uut = BitFieldAsciiEncoder(fmt)
+            for value in [0, 1, 255, -17, 0x12345678]:
+                self.assertEqual(uut.encode(value, 32, True), Bits(bytes=strToBytes(fmt % value)))
+
+    def testCachedValues(self):
+        uut = BitFieldAsciiEncoder('%d')
+        uut.cache_size = 10
+        for value in range(25):
+            self.assertEqual(uut.encode(value, 8, False), Bits(bytes=strToBytes('%d' % value)))
+            self.assertEqual(uut.encode(value, 8, False), Bits(bytes=strToBytes('%d' % value)))
+        self.assertLessEqual(len(uut._cache), uut.cache_size)
+
+
 class StrFuncEncoderTest(BaseTestCase):
 
     def setUp(self, cls=StrFuncEncoder):
@@ -168,6 +197,15 @@ class StrFuncEncoderTest(BaseTestCase):
         encoded = uut.encode('abc')
         self.assertIsInstance(encoded, Bits)
 
+    def testReturnValueBehavesLikeBits(self):
+        uut = self.get_default_encoder()
+        encoded = uut.encode('abc')
+        expected = Bits(bytes=self._encode_func('abc'))
+        self.assertEqual(encoded, expected)
+        self.assertEqual(hash(encoded), hash(expected))
+        self.assertEqual(encoded + Bits(bin='1'), expected + Bits(bin='1'))
+        self.assertEqual(encoded[4:12], expected[4:12])
+
     def testExceptionIfInputIsInt(self):
         uut = self.get_default_encoder()
         with self.assertRaises(KittyException):
@@ -211,6 +249,23 @@ class StrEncodeEncoderTest(StrFuncEncoderTest):
         return self.cls(self.encoding)
 
 
+class StrEncodeEncoderUtf8Test(StrEncodeEncoderTest):
+
+    def setUp(self, cls=StrEncodeEncoder):
+        super(StrEncodeEncoderUtf8Test, self).setUp(cls)
+        self.encoding = 'utf-8'
+
+    def _encode_func(self, s):
+        return strToBytes(s).decode('latin-1').encode('utf-8')
+
+    def testNonAsciiValueEncoded(self):
+        uut = self.get_default_encoder()
+        self.assertEqual(uut.encode(b'a\xe9\x80').tobytes(), b'a\xc3\xa9\xc2\x80')
+
+    def testBitsEncoderUtf8(self):
+        self.assertEqual(ENC_BITS_UTF8.encode(Bits(bytes=b'\xe9')).tobytes(), b'\xc3\xa9')
+
+
 class StrNullTerminatedEncoderTest(StrFuncEncoderTest):
 
     def setUp(self, cls=StrNullTerminatedEncoder):
@@ -260,6 +315,16 @@ class ReverseBitsEncoderTest(BitsEncoderTest):
     def _encode_func(self, bits):
         return bits[::-1]
 
+    def testReverseMultipleBytes(self):
+        value = Bits(bytes=b'\x01\x02\xf0\x3c')
+        uut = self.get_default_encoder()
+        self.assertEqual(uut.encode(value), self._encode_func(value))
+
+    def testReverseNotByteAligned(self):
+        value = Bits(bin='110100111010')
+        uut = self.get_default_encoder()
+        self.assertEqual(uut.encode(value), self._encode_func(value))
+
 
 class ByteAlignedBitsEncoderTest(BitsEncoderTest):
 
@@ -330,3 +395,45 @@ class BitsFuncEncoderTest(BitsEncoderTest):
 
     def get_default_encoder(self):
         return self.cls(self._encode_func)
+
+
+class MakeBitsTest(BaseTestCase):
+    '''
+    _make_bits builds Bits objects around bitstring's internals,
+    check that it gives the same objects as the public constructor.
+    '''
+
+    def setUp(self):
+        super(MakeBitsTest, self).setUp(None)
+        self.values = [b'', b'\x00', b'\xff', b'\x80\x01', b'kitty' * 100, bytes(bytearray(range(256)))]
+
+    def _testSameAsConstructor(self, cls):
+        for data in self.values:
+            bits = encoder._make_bits(data, cls)
+            expected = cls(bytes=data)
+            self.assertIs(type(bits), cls)
+            self.assertEqual(bits, expected)
+            self.assertEqual(len(bits), len(data) * 8)
+            self.assertEqual(bits.bytes, data)
+            self.assertEqual(bits.tobytes(), data)
+            self.assertEqual(bits.bin, expected.bin)
+            self.assertEqual(bits + expected, expected + expected)
+            self.assertEqual(bits[3:-2], expected[3:-2])
+            self.assertEqual(bits[::-1], expected[::-1])
+
+    def testSameAsConstructorBits(self):
+        self._testSameAsConstructor(Bits)
+
+    def testSameAsConstructorBitArray(self):
+        self._testSameAsConstructor(BitArray)
+
+    def testBitArrayDoesNotShareBuffer(self):
+        data = bytearray(b'\x00\x00')
+        bits = encoder._make_bits(data, BitArray)
+        bits.invert()
+        self.assertEqual(data, bytearray(b'\x00\x00'))
+        self.assertEqual(bits.bytes, b'\xff\xff')
+
+    def testFastPathEnabled(self):
+        # the fast path is disabled at import time if it gives wrong results
+        self.assertTrue(encoder._make_bits_works())